@@ -1,53 +1,275 @@
 import streamlit as st
 import dropbox
 import pandas as pd
+import atexit
+import contextlib
+import hashlib
+import io
 import json
 import os
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from filelock import FileLock
 
 
-dbx = dropbox.Dropbox(
-    app_key=st.secrets["DROPBOX_APP_KEY"],
-    app_secret=st.secrets["DROPBOX_APP_SECRET"],
-    oauth2_refresh_token=st.secrets["DROPBOX_REFRESH_TOKEN"],
-)
-REMOTE_CSV_PATH = st.secrets["DROPBOX_PATH"]  # e.g. "/gpt_matches.csv"
+@st.cache_resource
+def get_dbx():
+    """
+    One shared Dropbox client per server process, so its HTTP session
+    (and the pooled keep-alive connections) survives reruns.
+    """
+    return dropbox.Dropbox(
+        app_key=st.secrets["DROPBOX_APP_KEY"],
+        app_secret=st.secrets["DROPBOX_APP_SECRET"],
+        oauth2_refresh_token=st.secrets["DROPBOX_REFRESH_TOKEN"],
+        session=dropbox.create_session(),
+    )
 
 
-def upload_to_dropbox(local_file="gpt_matches.csv"):
-    """Upload local CSV to Dropbox at REMOTE_CSV_PATH."""
-    try:
-        with open(local_file, "rb") as f:
-            dbx.files_upload(
-                f.read(),
-                REMOTE_CSV_PATH,
-                mode=dropbox.files.WriteMode("overwrite")
-            )
-    except Exception as e:
-        st.warning(f"Could not upload CSV to Dropbox: {e}")
+dbx = get_dbx()
+REMOTE_CSV_PATH = st.secrets["DROPBOX_PATH"]  # e.g. "/gpt_matches.csv", only read to migrate old data
+REMOTE_PATH = os.path.splitext(REMOTE_CSV_PATH)[0] + ".parquet"
+
+# Debounce Dropbox writes: flush after this many labels or this many seconds
+UPLOAD_EVERY_N_LABELS = 5
+UPLOAD_EVERY_SECONDS = 10
+# Exists while locally saved labels have not reached Dropbox yet
+UNSYNCED_MARKER = "gpt_matches.parquet.unsynced"
+
+# Dropbox content_hash: SHA-256 over the SHA-256 digests of 4 MB blocks
+DROPBOX_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Downloads are streamed to disk in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def upload_to_dropbox(data: bytes):
+    """
+    Upload serialized Parquet bytes to Dropbox at REMOTE_PATH.
+    Runs on the upload pool, so errors are raised, re-buffered by
+    _upload_done() and shown by report_upload_errors() instead of via st.warning.
+    """
+    dbx.files_upload(
+        data,
+        REMOTE_PATH,
+        mode=dropbox.files.WriteMode("overwrite")
+    )
+
+
+def dropbox_content_hash(local_file):
+    """Compute the Dropbox content_hash of a local file."""
+    block_hashes = b""
+    with open(local_file, "rb") as f:
+        while block := f.read(DROPBOX_HASH_BLOCK_SIZE):
+            block_hashes += hashlib.sha256(block).digest()
+    return hashlib.sha256(block_hashes).hexdigest()
+
 
+def _is_not_found(e: dropbox.exceptions.ApiError) -> bool:
+    """True if a Dropbox ApiError means that the remote path does not exist."""
+    error = e.error
+    return hasattr(error, "is_path") and error.is_path() and error.get_path().is_not_found()
 
-def download_from_dropbox(local_file="gpt_matches.csv"):
-    """Download CSV from Dropbox to local file. Returns True if successful."""
+
+def download_from_dropbox(remote_path=REMOTE_PATH, local_file="gpt_matches.parquet"):
+    """
+    Download a file from Dropbox to local file. Returns True if successful,
+    False if the remote file does not exist; other errors are raised.
+    Skips the download if the local file already has the remote content_hash.
+    """
     try:
-        md, res = dbx.files_download(REMOTE_CSV_PATH)
-    except dropbox.exceptions.ApiError:
-        # File not found yet -> treat as first run
-        return False
-    except Exception as e:
-        st.warning(f"Could not download CSV from Dropbox: {e}")
-        return False
-
-    with open(local_file, "wb") as f:
-        f.write(res.content)
+        md = dbx.files_get_metadata(remote_path)
+        if os.path.exists(local_file) and dropbox_content_hash(local_file) == md.content_hash:
+            return True
+        md, res = dbx.files_download(remote_path)
+        # Stream to disk instead of holding the whole body in memory, into a
+        # temp file that is only swapped in once the download is complete
+        tmp_file = local_file + ".tmp"
+        with contextlib.closing(res), open(tmp_file, "wb") as f:
+            for chunk in res.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(tmp_file, local_file)
+    except dropbox.exceptions.ApiError as e:
+        if _is_not_found(e):
+            # File not found yet -> treat as first run
+            return False
+        raise
     return True
 
 
+@st.cache_resource
+def get_upload_pool():
+    """Single worker, so uploads reach Dropbox in the order they were queued."""
+    return ThreadPoolExecutor(max_workers=1)
+
+
+def report_upload_errors():
+    """Show a warning to every session while the last background upload has failed."""
+    error = get_pending_upload()["error"]
+    if error is not None:
+        st.warning(f"Could not upload annotations to Dropbox (will retry): {error}")
+
+
+@st.cache_resource
+def get_pending_upload():
+    """
+    Process-wide buffer for the newest Parquet bytes that still need to go to Dropbox.
+    Shared by all sessions, since they all write the same local file.
+    Whatever is still buffered is uploaded when the process exits.
+    """
+    pending = {
+        "lock": threading.Lock(),
+        "data": None,
+        "seq": 0,  # incremented for every queued version of the bytes
+        "labels": 0,
+        "last_upload": time.monotonic(),
+        "timer": None,
+        "error": None,  # error of the last finished upload, None if it succeeded
+        "unsynced": os.path.exists(UNSYNCED_MARKER),
+    }
+    atexit.register(_upload_at_exit, pending)
+    return pending
+
+
+def _set_unsynced(pending, unsynced):
+    """Create or remove UNSYNCED_MARKER. Call with pending["lock"] held."""
+    if pending["unsynced"] == unsynced:
+        return
+    if unsynced:
+        open(UNSYNCED_MARKER, "w").close()
+    elif os.path.exists(UNSYNCED_MARKER):
+        os.remove(UNSYNCED_MARKER)
+    pending["unsynced"] = unsynced
+
+
+def _upload_at_exit(pending):
+    """
+    Synchronously upload the buffered bytes on shutdown (the trailing timer is a
+    daemon thread and dies with the process). If this fails, UNSYNCED_MARKER
+    stays, so the next start keeps and uploads the local file.
+    """
+    with pending["lock"]:
+        data = pending["data"]
+        pending["data"] = None
+    if data is None:
+        return
+    try:
+        upload_to_dropbox(data)
+    except Exception:
+        return
+    with pending["lock"]:
+        _set_unsynced(pending, False)
+
+
+def _start_timer(pending, pool):
+    """Start the trailing flush timer, if none is running. Call with pending["lock"] held."""
+    if pending["timer"] is None:
+        timer = threading.Timer(UPLOAD_EVERY_SECONDS, _flush_pending, args=(pending, pool))
+        timer.daemon = True
+        timer.start()
+        pending["timer"] = timer
+
+
+def _upload_done(pending, pool, data, seq, future):
+    """
+    Record the result of an upload. If it failed and nothing newer was queued
+    meanwhile, put its bytes back into the buffer, so they are retried.
+    """
+    error = future.exception()
+    with pending["lock"]:
+        pending["error"] = error
+        if pending["data"] is not None or pending["seq"] != seq:
+            return  # newer bytes were queued meanwhile
+        if error is None:
+            _set_unsynced(pending, False)
+        else:
+            pending["data"] = data
+            _start_timer(pending, pool)
+
+
+def _flush_pending(pending, pool):
+    """
+    Submit the buffered bytes (if any) to the upload pool.
+    Also runs on the timer and upload threads, so it must not touch st.* APIs.
+    """
+    with pending["lock"]:
+        data = pending["data"]
+        seq = pending["seq"]
+        timer = pending["timer"]
+        pending["data"] = None
+        pending["labels"] = 0
+        pending["last_upload"] = time.monotonic()
+        pending["timer"] = None
+    if timer is not None:
+        timer.cancel()
+    if data is None:
+        return
+    future = pool.submit(upload_to_dropbox, data)
+    future.add_done_callback(lambda f: _upload_done(pending, pool, data, seq, f))
+
 
-if download_from_dropbox():
-    st.info("Loaded latest CSV from Dropbox.")
+def flush_upload():
+    """Upload the buffered Parquet bytes (if any) to Dropbox in the background."""
+    _flush_pending(get_pending_upload(), get_upload_pool())
+
+
+def queue_upload(data: bytes):
+    """
+    Buffer the latest Parquet bytes and only upload once UPLOAD_EVERY_N_LABELS
+    labels piled up or UPLOAD_EVERY_SECONDS passed since the last upload.
+    A trailing timer makes sure buffered labels go out within
+    UPLOAD_EVERY_SECONDS even if nobody labels again.
+    """
+    pending = get_pending_upload()
+    with pending["lock"]:
+        pending["data"] = data
+        pending["seq"] += 1
+        pending["labels"] += 1
+        _set_unsynced(pending, True)
+        due = (
+            pending["labels"] >= UPLOAD_EVERY_N_LABELS
+            or time.monotonic() - pending["last_upload"] >= UPLOAD_EVERY_SECONDS
+        )
+        if not due:
+            _start_timer(pending, get_upload_pool())
+    if due:
+        flush_upload()
+
+
+@st.cache_resource
+def sync_from_dropbox():
+    """
+    Pull the remote annotations once per server process. Doing it on every rerun
+    would overwrite labels that are saved locally but not yet flushed to Dropbox.
+    Errors are raised, so only a completed sync (or "no remote file") is cached.
+    """
+    if os.path.exists(UNSYNCED_MARKER) and os.path.exists("gpt_matches.parquet"):
+        # The previous process died before uploading its last labels
+        # -> keep the local file (it wins over the remote one) and upload it
+        with open("gpt_matches.parquet", "rb") as f:
+            queue_upload(f.read())
+        flush_upload()
+        return True
+    if download_from_dropbox():
+        return True
+    # No Parquet file yet -> fall back to the CSV written by older versions
+    return download_from_dropbox(REMOTE_CSV_PATH, "gpt_matches.csv")
+
+
+try:
+    synced = sync_from_dropbox()
+except Exception as e:
+    # Don't work on (and later upload) stale local data -> retry on the next rerun
+    st.error(f"Could not download annotations from Dropbox: {e}. Please reload the page.")
+    st.stop()
+
+if synced:
+    st.info("Loaded latest annotations from Dropbox.")
 else:
-    st.warning("No Dropbox CSV found — using local file.")
+    st.warning("No Dropbox annotations found — using local file.")
+report_upload_errors()
 # -----------------------------------------------------------------------------
 # 0. Page config
 # -----------------------------------------------------------------------------
@@ -60,74 +282,140 @@ st.set_page_config(
 # 1. Paths / constants
 # -----------------------------------------------------------------------------
 SAMPLE_JSON_PATH = "sample_200.json"
-CSV_PATH = "gpt_matches.csv"   # ID, GPT, and per-user columns
+ANNOTATIONS_PATH = "gpt_matches.parquet"   # one row per label: ID, user, label
+CSV_PATH = "gpt_matches.csv"   # initial GPT labels (ID, GPT), only read until the first save
+LOCK_PATH = ANNOTATIONS_PATH + ".lock"
 
 
 # -----------------------------------------------------------------------------
 # 2. Data loading / saving helpers
 # -----------------------------------------------------------------------------
-@st.cache_data
+@st.cache_resource
 def load_samples():
     """
     Load the 200 sampled entries from JSON.
     Expected format: list of dicts with keys: id, title, abstract
+    Cached as a shared resource (no copy per call), so callers must not mutate the results.
+    Returns the DataFrame and a dict {id: {"title": ..., "abstract": ...}}
+    for direct lookups (first entry wins for duplicate IDs).
     """
     with open(SAMPLE_JSON_PATH, "r", encoding="utf-8") as f:
         data = json.load(f)
     df = pd.DataFrame(data)
     df["id"] = df["id"].astype(str)
-    return df
+    samples_map = (
+        df.drop_duplicates(subset=["id"], keep="first")
+        .set_index("id")[["title", "abstract"]]
+        .to_dict("index")
+    )
+    return df, samples_map
+
+
+def _annotations_version():
+    """
+    (path, stamp) of the file load_annotations would read. The stamp includes
+    inode and size next to the mtime: with coarse timestamps two quick saves
+    can share an mtime, but save_annotations always swaps in a new inode.
+    """
+    path = ANNOTATIONS_PATH if os.path.exists(ANNOTATIONS_PATH) else CSV_PATH
+    if not os.path.exists(path):
+        return path, None
+    stat = os.stat(path)
+    return path, (stat.st_mtime_ns, stat.st_ino, stat.st_size)
 
 
 def load_annotations():
     """
-    Load annotations and force a clean structure:
-    - exactly one row per ID from sample_200.json
-    - drop any duplicate IDs from the CSV
+    Load annotations, re-reading the file only when it changed.
+    The frame this session loaded or saved last is reused as long as no
+    other session wrote the file since.
+    """
+    version = _annotations_version()
+    own = st.session_state.get("ann_df")
+    if own is not None and st.session_state.get("ann_version") == version:
+        return own
+    ann_df = _load_annotations(*version)
+    st.session_state["ann_df"] = ann_df
+    st.session_state["ann_version"] = version
+    return ann_df
+
+
+def _to_long(ann_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the old wide layout (ID, GPT, one column per user)
+    to one row per label (ID, user, label). GPT becomes the user "GPT".
+    """
+    ann_df = ann_df.melt(id_vars="ID", var_name="user", value_name="label")
+    return ann_df.dropna(subset=["label"])
+
+
+@st.cache_data(max_entries=1)
+def _load_annotations(path, stamp):
+    """
+    Load annotations (ID, user, label) and force a clean structure:
+    - at most one label per ID and user
+    - only IDs from sample_200.json
+    - indexed by (ID, user) for direct lookups
+    stamp is only used as cache key.
     """
-    samples_df = load_samples()
+    samples_df, _ = load_samples()
     ids = samples_df["id"].astype(str).tolist()
 
-    if os.path.exists(CSV_PATH):
-        ann_df = pd.read_csv(CSV_PATH, dtype={"ID": str})
+    if path == ANNOTATIONS_PATH:
+        ann_df = pd.read_parquet(ANNOTATIONS_PATH)
+    elif os.path.exists(CSV_PATH):
+        ann_df = pd.read_csv(CSV_PATH, dtype={"ID": str, "GPT": "Int8"})
     else:
-        # Initialize fresh CSV if it doesn't exist
+        # Initialize fresh annotations (GPT labels all 0) if no file exists
         ann_df = pd.DataFrame({
             "ID": ids,
-            "GPT": [0] * len(ids),
+            "user": "GPT",
+            "label": 0,
         })
 
-    # Ensure ID is string
-    ann_df["ID"] = ann_df["ID"].astype(str)
+    # 🔧 1) Files from older versions have one column per user
+    if "user" not in ann_df.columns:
+        ann_df = _to_long(ann_df)
 
-    # 🔧 1) Drop duplicate IDs (keep first)
-    ann_df = ann_df.drop_duplicates(subset=["ID"], keep="first")
+    # Ensure ID is string and labels are small nullable ints (0/1)
+    ann_df["ID"] = ann_df["ID"].astype(str)
+    ann_df["label"] = ann_df["label"].astype("Int8")
 
-    # 🔧 2) Keep only IDs that are really in sample_200.json
-    ann_df = ann_df[ann_df["ID"].isin(ids)]
+    # 🔧 2) In one filter on the (ID, user) index:
+    #       drop duplicate labels (keep first) and keep only IDs from sample_200.json
+    ann_df = ann_df.set_index(["ID", "user"])
+    keep = ~ann_df.index.duplicated(keep="first") & ann_df.index.get_level_values("ID").isin(ids)
 
-    # 🔧 3) Make sure we have *exactly* one row per ID in sample_200.json
-    base = pd.DataFrame({"ID": ids})  # ordered like sample_200.json
-    ann_df = base.merge(ann_df, on="ID", how="left")
+    return ann_df[keep]
 
-    # 🔧 4) Ensure GPT exists and is int
-    if "GPT" not in ann_df.columns:
-        ann_df["GPT"] = 0
-    ann_df["GPT"] = ann_df["GPT"].fillna(0).astype(int)
 
-    return ann_df
+def annotations_lock():
+    """
+    Exclusive lock for read-modify-write of the annotations file.
+    A new FileLock per call, so it also serializes sessions (threads)
+    of the same Streamlit process.
+    """
+    return FileLock(LOCK_PATH)
 
 
-def save_annotations(df: pd.DataFrame):
+def save_annotations(df: pd.DataFrame) -> bytes:
     """
-    Save annotations back to CSV, again enforcing:
-    - one row per ID
+    Save annotations to Parquet, again enforcing:
+    - one row per ID and user
     - no duplicates
+    Returns the written bytes so they can be uploaded without re-reading the file.
     """
-    df = df.copy()
-    df["ID"] = df["ID"].astype(str)
-    df = df.drop_duplicates(subset=["ID"], keep="first")
-    df.to_csv(CSV_PATH, index=False)
+    if df.index.has_duplicates:
+        df = df[~df.index.duplicated(keep="first")]
+    buf = io.BytesIO()
+    df.reset_index().to_parquet(buf, index=False, compression="zstd")
+    data = buf.getvalue()
+    # Write to a temp file and swap it in, so readers never see a partial file
+    tmp_path = ANNOTATIONS_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, ANNOTATIONS_PATH)
+    return data
 
 
 
@@ -185,8 +473,11 @@ with col2:
         """
     )
 
+# Number of distinct entries to label (sample_200.json contains one ID twice)
+n_entries = len(load_samples()[1])
+
 st.markdown(
-    """
+    f"""
 ---
 
 ### Your Task
@@ -197,31 +488,38 @@ After reading the title and abstract:
 - **No** → The paper does *not* fit the topic **or** it fits but does *not* explicitly mention any database/study/cohort name.
 
 Use the **Yes/No** buttons below each abstract.  
-Each user must label all **200 entries**.
+Each user must label all **{n_entries} entries**.
 """
 )
 
 
 # -----------------------------------------------------------------------------
-# 4. Load data & ensure user column exists
+# 4. Load data
 # -----------------------------------------------------------------------------
-samples_df = load_samples()
+samples_df, samples_map = load_samples()
 ann_df = load_annotations()
 
-# Add user column if not existing
-if username not in ann_df.columns:
-    ann_df[username] = pd.NA
-    save_annotations(ann_df)
-    ann_df = load_annotations()
-
 # -----------------------------------------------------------------------------
 # 5. Progress and remaining IDs for this user
 # -----------------------------------------------------------------------------
-user_col = ann_df[username]
-
-total_entries = len(ann_df)
-already_labeled = user_col.notna().sum()
-remaining = total_entries - already_labeled
+# IDs not yet labeled by this user: built once per user and annotations version
+# (e.g. labels from another tab of the same user), otherwise kept up to date
+# by update_label_and_rerun instead of rescanning the labels every rerun
+if (
+    st.session_state.get("remaining_user") != username
+    or st.session_state.get("remaining_version") != st.session_state["ann_version"]
+):
+    user_rows = ann_df.index.get_level_values("user") == username
+    labeled_ids = set(ann_df.index.get_level_values("ID")[user_rows])
+    st.session_state["remaining_ids"] = set(samples_df["id"]) - labeled_ids
+    st.session_state["remaining_user"] = username
+    st.session_state["remaining_version"] = st.session_state["ann_version"]
+    st.session_state["total_entries"] = samples_df["id"].nunique()
+remaining_ids = st.session_state["remaining_ids"]
+
+total_entries = st.session_state["total_entries"]
+remaining = len(remaining_ids)
+already_labeled = total_entries - remaining
 
 st.subheader(f"User: {username}")
 st.write(f"Labeled entries: **{already_labeled} / {total_entries}**")
@@ -230,79 +528,87 @@ progress_fraction = already_labeled / total_entries if total_entries > 0 else 0
 st.progress(progress_fraction)
 
 if remaining == 0:
-    st.success("🎉 You have labeled all 200 entries. Thank you!")
+    flush_upload()
+    st.success(f"🎉 You have labeled all {total_entries} entries. Thank you!")
     st.stop()
 
-# IDs not yet labeled by this user
-remaining_ids = ann_df.loc[user_col.isna(), "ID"].tolist()
-
 # -----------------------------------------------------------------------------
 # 6. Choose a random ID for this session
 # -----------------------------------------------------------------------------
 if "current_id" not in st.session_state or st.session_state["current_id"] not in remaining_ids:
-    st.session_state["current_id"] = random.choice(remaining_ids)
+    st.session_state["current_id"] = random.choice(tuple(remaining_ids))
 
 current_id = st.session_state["current_id"]
 
 # Get title + abstract for this ID
-row = samples_df[samples_df["id"] == current_id]
-if row.empty:
+sample = samples_map.get(current_id)
+if sample is None:
     st.error(f"No entry found in sample_200.json for ID {current_id}.")
     st.stop()
 
-row = row.iloc[0]
-title = row["title"]
-abstract = row["abstract"]
+title = sample["title"]
+abstract = sample["abstract"]
 
 # -----------------------------------------------------------------------------
 # 7. Show the current abstract and buttons
 # -----------------------------------------------------------------------------
-st.markdown("---")
-st.markdown(f"### Current ID: `{current_id}`")
-st.markdown(f"**Title:** {title}")
-st.markdown("**Abstract:**")
-st.write(abstract)
-
-st.markdown("---")
-st.markdown(
-    """
+# A form, so a click submits once and only reruns the script on submit
+with st.form("label_form", border=False):
+    st.markdown("---")
+    st.markdown(f"### Current ID: `{current_id}`")
+    st.markdown(f"**Title:** {title}")
+    st.markdown("**Abstract:**")
+    st.write(abstract)
+
+    st.markdown("---")
+    st.markdown(
+        """
 **Question (placeholder):**  
 Does this title/abstract clearly describe or refer to a *database / cohort / registry*  
 that is relevant for our systematic database search?
 """
-)
+    )
 
-col_yes, col_no = st.columns(2)
+    col_yes, col_no = st.columns(2)
 
-yes_clicked = col_yes.button("✅ Yes – contains a relevant database")
-no_clicked = col_no.button("❌ No – does *not* contain a relevant database")
+    yes_clicked = col_yes.form_submit_button("✅ Yes – contains a relevant database")
+    no_clicked = col_no.form_submit_button("❌ No – does *not* contain a relevant database")
 
 # -----------------------------------------------------------------------------
-# 8. Handle clicks: update CSV, pick next ID, avoid overwriting
+# 8. Handle clicks: update annotations, pick next ID, avoid overwriting
 # -----------------------------------------------------------------------------
 def update_label_and_rerun(label_value: int):
     """
     label_value: 1 for Yes, 0 for No
     """
-    global ann_df
-    # Reload to avoid stale cache when multiple users work in parallel (simple safeguard)
-    ann_df_local = load_annotations()
-    if username not in ann_df_local.columns:
-        ann_df_local[username] = pd.NA
-
-    mask = (ann_df_local["ID"] == current_id)
-    if mask.sum() == 0:
-        st.error(f"Internal error: ID {current_id} not found in annotation file.")
-        return
-
-    # Only set value if it was NaN before -> avoid overwriting existing labels
-    current_val = ann_df_local.loc[mask, username].iloc[0]
-    if pd.isna(current_val):
-        ann_df_local.loc[mask, username] = label_value
-        save_annotations(ann_df_local)
-        upload_to_dropbox("gpt_matches.csv")
-        
-    # else: do nothing, preserves previous decision
+    # Under the lock, reuse the frame loaded for this rerun unless another
+    # session saved in between, so labels of parallel users are never lost
+    with annotations_lock():
+        ann_df_local = load_annotations()
+        # Whether remaining_ids matches this frame, i.e. nobody else saved since the rerun
+        remaining_current = st.session_state.get("remaining_version") == st.session_state["ann_version"]
+
+        # Only add a label if this user has none for the ID yet -> avoid overwriting existing labels
+        if (current_id, username) not in ann_df_local.index:
+            # Append with concat: .loc enlargement on the unsorted MultiIndex
+            # warns about lexsort depth and copies the frame just the same
+            new_row = pd.DataFrame(
+                {"label": pd.array([label_value], dtype="Int8")},
+                index=pd.MultiIndex.from_tuples([(current_id, username)], names=["ID", "user"]),
+            )
+            ann_df_local = pd.concat([ann_df_local, new_row])
+            data = save_annotations(ann_df_local)
+            queue_upload(data)
+            # Keep the saved frame, so the next rerun does not parse it again
+            st.session_state["ann_df"] = ann_df_local
+            st.session_state["ann_version"] = _annotations_version()
+            if remaining_current:
+                # discard() below applies this save to remaining_ids -> no rebuild needed
+                st.session_state["remaining_version"] = st.session_state["ann_version"]
+
+        # else: do nothing, preserves previous decision
+
+    st.session_state["remaining_ids"].discard(current_id)
 
     # Force picking a new ID on next run
     st.session_state["current_id"] = None